@@ -1,26 +1,72 @@
 # Om_1_0.py — Om meditation coach (Guided + Self-guided), 4 phases, auto-TTS, auto-phases, chat, PDF certificate
 # Run:
 # panel serve Om_1_0.py --address=0.0.0.0 --port=8704 --allow-websocket-origin='*'
+# Scale out (each process owns its own state and OpenAI connection pool):
+# panel serve Om_1_0.py --address=0.0.0.0 --port=8704 --allow-websocket-origin='*' --num-procs 4 --num-threads 8
 
 import io
 import os
-import base64
+import re
+import sys
+import asyncio
+import binascii
+import hashlib
+import tempfile
 import textwrap
+import threading
+import functools
+import itertools
+import collections
+import importlib.util
+import concurrent.futures
+from functools import partial
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+# ---------- .env & API ----------
+# Loaded first: the launcher below reads OM_NUM_PROCS / OM_NUM_THREADS from it too
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+# `python Om_1_0.py`: choose the process model before any client, pool or widget is built.
+# One process by default, which also serves TTS clips over the /tts/ route. Set
+# OM_NUM_PROCS > 1 to scale out instead (clips are then inlined as base64); each process
+# runs OM_NUM_THREADS callback threads. fork() is unavailable on Windows: single process there.
+if __name__ == "__main__":
+    _NUM_PROCS = 1 if os.name == "nt" else int(os.getenv("OM_NUM_PROCS") or 1)
+    _NUM_THREADS = int(os.getenv("OM_NUM_THREADS") or 8)
+    if _NUM_PROCS > 1:
+        # pn.serve cannot fork around its own IOLoop, so hand over to the `panel serve` CLI.
+        # Only a single process mounts the /tts/ route (a fetch could land on another worker
+        # than the one holding the clip), so every clip is inlined as base64 there.
+        os.execv(sys.executable, [
+            sys.executable, "-m", "panel", "serve", os.path.abspath(__file__),
+            "--address", "0.0.0.0", "--port", "8913", "--allow-websocket-origin", "*",
+            "--num-procs", str(_NUM_PROCS), "--num-threads", str(_NUM_THREADS),
+        ])
 
 import panel as pn
 from panel.template import FastListTemplate
 pn.extension(notifications=True)
 
-# ---------- .env & API ----------
-from dotenv import load_dotenv
-load_dotenv(override=True)
 if not os.getenv("OPENAI_API_KEY"):
     raise ValueError("OPENAI_API_KEY missing. Put it in .env or export before serving.")
 
-from openai import OpenAI
-client = OpenAI()
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+# One pooled keep-alive connection set per process, shared by every session
+# (`panel serve` re-runs this script per session). HTTP/2 when `h2` is installed.
+_HTTP2 = importlib.util.find_spec("h2") is not None
+# keepalive_expiry: stay warm across the quiet stretches of a session (certificate note at the end)
+_HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60)
+if "om_openai" not in pn.state.cache:
+    pn.state.cache["om_openai"] = (
+        OpenAI(http_client=httpx.Client(http2=_HTTP2, limits=_HTTP_LIMITS, timeout=30.0)),
+        # streaming / overlapped calls on Panel's event loop
+        AsyncOpenAI(http_client=httpx.AsyncClient(http2=_HTTP2, limits=_HTTP_LIMITS, timeout=30.0)),
+    )
+client, aclient = pn.state.cache["om_openai"]
 
 # ---------- Cross-version helper ----------
 def call_soon(ms: int, fn):
@@ -31,6 +77,25 @@ def call_soon(ms: int, fn):
     else:
         pn.state.curdoc.add_timeout_callback(fn, ms)
 
+# Blocking I/O (OpenAI, PDF agent) runs here, never under the Bokeh document lock
+if "om_executor" not in pn.state.cache:
+    pn.state.cache["om_executor"] = concurrent.futures.ThreadPoolExecutor(
+        max_workers=8, thread_name_prefix="om-io")
+_EXEC: concurrent.futures.ThreadPoolExecutor = pn.state.cache["om_executor"]
+
+def run_in_background(fn, *args, done=None) -> concurrent.futures.Future:
+    """Run `fn(*args)` on _EXEC; `done(future)` is called back on this session's document."""
+    doc = pn.state.curdoc
+    fut = _EXEC.submit(fn, *args)
+    if done is not None:
+        def _back(f):
+            if doc is not None and doc.session_context is not None:
+                doc.add_next_tick_callback(partial(done, f))
+            else:
+                done(f)
+        fut.add_done_callback(_back)
+    return fut
+
 # ---------- Personas / intents ----------
 PERSONAS: Dict[str, Dict] = {
     "Self-guided (silent, user-led)": {
@@ -87,6 +152,7 @@ PHASES = [
 SAFETY = "Gentle reminder: pause or stop if any discomfort arises."
 
 # ---------- State ----------
+CHAT_MAX = 64   # chat entries kept per session; the oldest fall off
 default_persona_key = list(PERSONAS.keys())[0]  # Self-guided first
 state = {
     "persona": default_persona_key,
@@ -96,33 +162,158 @@ state = {
     "mantra": DEFAULT_MANTRA[INTENTS[0]],
     "mantra_customized": False,     # NEW: track if user edited mantra
     "minutes": 10,
-    "chat": [],                     # [{"role": "user"/"assistant", "content": "..."}]
+    "chat": collections.deque(maxlen=CHAT_MAX),  # [{"role": "user"/"assistant", "content": "..."}]
     "start_at": None,
     "end_at": None,
+    "total_sec": 0,
+    "total_str": "00:00",
     "phase_i": 0,
     "phase_marks": [],              # seconds at which to auto-advance (for phases 1..3)
+    "prefetch": {"phase_i": None, "text": None, "mp3": None},  # next guided phase, warmed up early
+    "audio_blobs": {},              # uid -> (created monotonic, mp3) served at /tts/<uid>
+    "summary": "",                  # one-line memory of chat turns no longer sent verbatim
+    "summarized": 0,                # how many leading chat entries the summary covers
+    "summary_pending": False,       # a summary request is in flight
+    "chat_evicted": 0,              # entries the chat deque has dropped this session
+    "sg_texts": (),                 # self-guided phase texts, rendered once per session
+    "last_assistant_text": "",      # what Repeat replays
+    "tts_js_injected": False,       # page already has the window.omTTS player
+    "tts_seq": 0,                   # per-clip nonce: Bokeh drops an unchanged HTML update
+    "tts_play_lock": None,          # asyncio.Lock, made on first use on the session's loop
 }
 
+# ---------- TTS cache ----------
+# (voice, sha1(text)) -> mp3 bytes, LRU, shared by every session in this process.
+# Opt-in: set OM_TTS_CACHE_DIR to also keep clips on disk, at most OM_TTS_CACHE_FILES of
+# them (oldest removed first).
+_TTS_MAX = 64
+_TTS_CACHE: "collections.OrderedDict[Tuple[str, str], bytes]" = pn.state.cache.setdefault(
+    "om_tts_cache", collections.OrderedDict())
+_TTS_LOCK = pn.state.cache.setdefault("om_tts_lock", threading.Lock())
+OM_TTS_CACHE_DIR = os.path.expanduser(os.getenv("OM_TTS_CACHE_DIR", ""))
+OM_TTS_CACHE_FILES = int(os.getenv("OM_TTS_CACHE_FILES") or 512)
+
+def _tts_key(text: str, voice: str) -> Tuple[str, str]:
+    return (voice, hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+def _tts_cache_path(key: Tuple[str, str]) -> str:
+    return os.path.join(OM_TTS_CACHE_DIR, f"{key[0]}-{key[1]}.mp3")
+
+def _tts_prune_disk():
+    try:
+        clips = [e for e in os.scandir(OM_TTS_CACHE_DIR) if e.name.endswith(".mp3")]
+    except OSError:
+        return
+    if len(clips) <= OM_TTS_CACHE_FILES:
+        return
+    # Another process sharing the directory may prune first: skip clips that are already gone
+    aged = []
+    for e in clips:
+        try: aged.append((e.stat().st_mtime, e.path))
+        except OSError: pass
+    aged.sort()
+    for _, path in aged[:len(aged) - OM_TTS_CACHE_FILES]:
+        try: os.remove(path)
+        except OSError: pass
+
+def _tts_persist(key: Tuple[str, str], mp3: bytes):
+    """Blocking file I/O: call from a worker thread, never on the event loop."""
+    try:
+        os.makedirs(OM_TTS_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=OM_TTS_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(mp3)
+        os.replace(tmp, _tts_cache_path(key))   # atomic: readers never see a partial clip
+    except OSError:
+        return   # best effort: the clip is still cached in memory and already played
+    _tts_prune_disk()
+
+def _tts_cache_put(key: Tuple[str, str], mp3: bytes, persist: bool = True):
+    if not mp3:
+        return
+    with _TTS_LOCK:
+        _TTS_CACHE[key] = mp3
+        _TTS_CACHE.move_to_end(key)
+        while len(_TTS_CACHE) > _TTS_MAX:
+            _TTS_CACHE.popitem(last=False)
+    if persist and OM_TTS_CACHE_DIR:
+        _tts_persist(key, mp3)
+
+def _tts_mem_get(key: Tuple[str, str]) -> Optional[bytes]:
+    with _TTS_LOCK:
+        mp3 = _TTS_CACHE.get(key)
+        if mp3 is not None:
+            _TTS_CACHE.move_to_end(key)
+        return mp3
+
+def _tts_disk_get(key: Tuple[str, str]) -> Optional[bytes]:
+    """Blocking file I/O, like _tts_persist."""
+    try:
+        with open(_tts_cache_path(key), "rb") as f:
+            mp3 = f.read()
+    except OSError:
+        return None
+    _tts_cache_put(key, mp3, persist=False)
+    return mp3 or None
+
+def _tts_cache_get(key: Tuple[str, str]) -> Optional[bytes]:
+    mp3 = _tts_mem_get(key)
+    if mp3 is None and OM_TTS_CACHE_DIR:
+        mp3 = _tts_disk_get(key)
+    return mp3
+
 # ---------- OpenAI helpers ----------
-def llm_reply(chat: List[Dict], sys_prompt: str) -> str:
+async def allm_reply_stream(chat: List[Dict], sys_prompt: str) -> AsyncIterator[str]:
+    """Chat reply from gpt-4o-mini, yielded delta by delta as it streams in."""
     messages = [{"role": "system", "content": sys_prompt}] + chat
-    resp = client.chat.completions.create(
+    stream = await aclient.chat.completions.create(
         model="gpt-4o-mini",
         temperature=0.5,
         max_tokens=400,
         messages=messages,
+        stream=True,
     )
-    return resp.choices[0].message.content.strip()
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            yield delta
 
 def tts_mp3(text: str, voice: str) -> bytes:
     if not text.strip() or not voice:
         return b""
-    audio = client.audio.speech.create(
-        model="gpt-4o-mini-tts",
-        voice=voice,
-        input=text,
-    )
-    return audio.read()
+    key = _tts_key(text, voice)
+    mp3 = _tts_cache_get(key)
+    if mp3 is None:
+        audio = client.audio.speech.create(
+            model="gpt-4o-mini-tts",
+            voice=voice,
+            input=text,
+        )
+        mp3 = audio.read()
+        _tts_cache_put(key, mp3)
+    return mp3
+
+async def atts_mp3(text: str, voice: str) -> bytes:
+    if not text.strip() or not voice:
+        return b""
+    key = _tts_key(text, voice)
+    # Memory lookups stay on the loop; anything touching the disk goes to _EXEC
+    mp3 = _tts_mem_get(key)
+    if mp3 is None and OM_TTS_CACHE_DIR:
+        mp3 = await asyncio.get_running_loop().run_in_executor(_EXEC, _tts_disk_get, key)
+    if mp3 is None:
+        audio = await aclient.audio.speech.create(
+            model="gpt-4o-mini-tts",
+            voice=voice,
+            input=text,
+        )
+        mp3 = audio.content
+        _tts_cache_put(key, mp3, persist=False)
+        if mp3 and OM_TTS_CACHE_DIR:
+            _EXEC.submit(_tts_persist, key, mp3)
+    return mp3
 
 # ---------- UI helpers ----------
 def bubble(role: str, text: str, title: str = None) -> pn.Column:
@@ -156,7 +347,7 @@ def audio_player_from_mp3(mp3_bytes: bytes) -> pn.pane.HTML:
     # Hidden audio, no controls, still autoplays
     if not mp3_bytes:
         return pn.pane.HTML("")
-    b64 = base64.b64encode(mp3_bytes).decode("utf-8")
+    b64 = binascii.b2a_base64(mp3_bytes, newline=False).decode("ascii")
     html = (
         '<audio id="tts_audio" autoplay style="display:none">'
         f'<source src="data:audio/mpeg;base64,{b64}"></audio>'
@@ -167,16 +358,23 @@ def audio_player_from_mp3(mp3_bytes: bytes) -> pn.pane.HTML:
     )
     return pn.pane.HTML(html, sizing_mode="stretch_width")
 
-def system_prompt() -> str:
+@functools.lru_cache(maxsize=32)
+def _sys_prompt_cached(persona: str, intent: str, mantra: str) -> str:
     return (
         "You are a compassionate meditation teacher.\n"
-        f"Persona: {state['persona']} — style: {PERSONAS[state['persona']]['style']}\n"
-        f"Intent: {state['intent']}; mantra: \"{state['mantra']}\".\n"
+        f"Persona: {persona} — style: {PERSONAS[persona]['style']}\n"
+        f"Intent: {intent}; mantra: \"{mantra}\".\n"
         f"{SAFETY}\n"
         "Keep replies brief (3–7 short sentences), invitational, sensory, kind. Avoid medical advice.\n"
         "End with a gentle check-in question."
     )
 
+def system_prompt() -> str:
+    base = _sys_prompt_cached(state["persona"], state["intent"], state["mantra"])
+    if state.get("summary"):
+        return f"{base}\nEarlier in this session: {state['summary']}"
+    return base
+
 def phase_prompt(i:int) -> str:
     title, goals = PHASES[i]
     return (
@@ -298,41 +496,62 @@ def show_step(i:int):
 
 # ---------- Session logic ----------
 tick_cb = None
+PREFETCH_LEAD = 10   # seconds before a phase mark to start preparing that phase
 
 def _set_timer(running:bool):
     global tick_cb
     if running and tick_cb is None:
-        tick_cb = pn.state.add_periodic_callback(_tick, period=1000)
+        tick_cb = pn.state.add_periodic_callback(_tick_display, period=2000)
     elif not running and tick_cb is not None:
         tick_cb.stop(); tick_cb=None
 
-def _fmt_total():
-    return int((state["end_at"] - state["start_at"]).total_seconds())
-
-def _tick():
+def _tick_display():
+    """Refresh the clock label only; phase changes and the finish are one-shot timers."""
     if not state["start_at"] or not state["end_at"]:
         return
-    now = datetime.now(timezone.utc)
-    if now >= state["end_at"]:
-        _set_timer(False)
-        total = _fmt_total()
-        timer_label.object = f"{_fmt(total)} / {_fmt(total)}"
-        next_btn.disabled = True
-        _on_session_finished()
-        return
-
-    elapsed = int((now - state["start_at"]).total_seconds())
-    total   = _fmt_total()
-    timer_label.object = f"{_fmt(elapsed)} / {_fmt(total)}"
-
-    # Auto advance at phase marks (for phases 1..3)
-    if state["phase_i"] < len(PHASES)-1:
-        marks = state.get("phase_marks", [])
-        if state["phase_i"] < len(marks) and elapsed >= marks[state["phase_i"]]:
-            _next(auto=True)
+    elapsed = int((datetime.now(timezone.utc) - state["start_at"]).total_seconds())
+    if elapsed >= state["total_sec"]:
+        elapsed = state["total_sec"]
+    timer_label.object = f"{_fmt(elapsed)} / {state['total_str']}"
+
+def _schedule(at_sec: float, fn):
+    """Run `fn` once, `at_sec` seconds into the current session; dropped if it was restarted."""
+    started = state["start_at"]
+    def _fire():
+        if state["start_at"] == started:
+            fn()
+    call_soon(max(0, int(at_sec * 1000)), _fire)
+
+def _phase_due(i:int):
+    # Auto advance at phase marks (for phases 1..3), unless the user already moved on
+    if state["phase_i"] == i:
+        _next(auto=True)
+
+def _prefetch_due(i:int):
+    if (state["mode"] == "guided" and state["phase_i"] == i
+            and state["prefetch"]["phase_i"] != i + 1):
+        _prefetch_phase(i + 1)
+
+def _session_due():
+    _set_timer(False)
+    timer_label.object = f"{state['total_str']} / {state['total_str']}"
+    next_btn.disabled = True
+    _on_session_finished()
+
+def _chat_append(role:str, txt:str):
+    chat = state["chat"]
+    if len(chat) == chat.maxlen:
+        state["chat_evicted"] += 1
+        if state["summarized"]:
+            state["summarized"] -= 1   # the entry about to fall off was already summarized
+    chat.append({"role":role,"content":txt})
+
+def _chat_tail(n:int) -> List[Dict]:
+    chat = state.get("chat", ())
+    return list(itertools.islice(chat, max(0, len(chat) - n), None))
 
 def append_user(txt:str):
-    state["chat"].append({"role":"user","content":txt})
+    _chat_append("user", txt)
     chat_box.append(bubble("user", txt))
     if hasattr(chat_box, "scroll_to_bottom"): chat_box.scroll_to_bottom()
 
@@ -341,29 +560,168 @@ def _speak_text(text: str):
     if not state.get("voice"):
         return
     try:
-        mp3 = tts_mp3(text, state["voice"])
-        audio_out.object = audio_player_from_mp3(mp3).object
-        call_soon(50, lambda: audio_out.param.trigger("object"))
+        _play_mp3(tts_mp3(text, state["voice"]))
     except Exception as e:
         pn.state.notifications.error(f"TTS error: {e}")
 
 def append_assistant(txt:str, title:str=None, speak=True):
-    state["chat"].append({"role":"assistant","content":txt})
+    _chat_append("assistant", txt)
+    state["last_assistant_text"] = txt
     chat_box.append(bubble("assistant", txt, title=title))
     if hasattr(chat_box, "scroll_to_bottom"): chat_box.scroll_to_bottom()
     if speak:
         _speak_text(txt)
 
+# A sentence ends at . ! ? or … (plus any closing quote/bracket) followed by whitespace
+_SENTENCE_END = re.compile(r"[.!?…][\"”’)]*\s+")
+
+def _split_sentences(buf: str):
+    """Split streamed text into (complete sentences, unfinished tail)."""
+    done, start = [], 0
+    for m in _SENTENCE_END.finditer(buf):
+        sentence = buf[start:m.end()].strip()
+        if sentence:
+            done.append(sentence)
+        start = m.end()
+    return done, buf[start:]
+
+def _notify_error(msg: str):
+    try:
+        pn.state.notifications.error(msg)
+    except Exception:
+        print(msg)
+
+async def astream_assistant(chat: List[Dict], sys_prompt: str, title: str = None,
+                            speak: bool = True, error_label: str = "LLM error"):
+    """
+    Stream an LLM reply into a fresh assistant bubble on Panel's event loop.
+    Deltas are pushed into the bubble as they arrive. Each completed sentence
+    starts its own TTS request right away, overlapping the rest of the stream,
+    and the clips are enqueued strictly in sentence order. Replies that overlap
+    (a chat answer and an auto-advanced phase) play one after the other, and a
+    reply outlived by its session (Start pressed again) is dropped.
+    """
+    started = state["start_at"]
+    def _stale() -> bool:
+        return state["start_at"] != started
+
+    voice = state.get("voice") if speak else None
+    head = f"### {title}\n\n" if title else ""
+
+    box = bubble("assistant", "…", title=title)
+    body = box[1]
+    chat_box.append(box)
+    if hasattr(chat_box, "scroll_to_bottom"): chat_box.scroll_to_bottom()
+
+    clips: asyncio.Queue = asyncio.Queue()   # TTS tasks in sentence order; None = done
+
+    async def _player():
+        # One reply enqueues at a time per session, so sentences never interleave
+        lock = state.get("tts_play_lock")
+        if lock is None:
+            lock = state["tts_play_lock"] = asyncio.Lock()
+        async with lock:
+            while True:
+                task = await clips.get()
+                if task is None:
+                    return
+                if _stale():
+                    task.cancel()
+                    continue
+                try:
+                    _play_mp3(await task)
+                except Exception as e:
+                    _notify_error(f"TTS error: {e}")
+
+    player = asyncio.ensure_future(_player()) if voice else None
+
+    def _say(sentence: str):
+        clips.put_nowait(asyncio.ensure_future(atts_mp3(sentence, voice)))
+
+    text, pending = "", ""
+    try:
+        async for delta in allm_reply_stream(chat, sys_prompt):
+            if _stale():
+                break
+            text += delta
+            body.object = head + text
+            if voice:
+                pending += delta
+                done, pending = _split_sentences(pending)
+                for sentence in done:
+                    _say(sentence)
+    except Exception as e:
+        if not _stale():
+            _notify_error(f"{error_label}: {e}")
+
+    text = text.strip()
+    if _stale():
+        pass   # _start already cleared the chat and the bubbles
+    elif text:
+        _chat_append("assistant", text)
+        state["last_assistant_text"] = text
+        if hasattr(chat_box, "scroll_to_bottom"): chat_box.scroll_to_bottom()
+    else:
+        chat_box.remove(box)
+    if player is not None:
+        if pending.strip() and not _stale():
+            _say(pending.strip())
+        clips.put_nowait(None)
+        await player
+
+CHAT_VERBATIM = 4    # most recent chat entries kept as-is once older ones are summarized
+CHAT_SEND_MAX = 12   # never send more than this many entries verbatim
+SUMMARY_BATCH = 6    # fold older entries into state["summary"] once this many pile up
+
+def _chat_unsummarized() -> List[Dict]:
+    """Chat entries the summary does not cover yet (the newest CHAT_SEND_MAX at most)."""
+    chat = state["chat"]
+    return list(itertools.islice(chat, max(state["summarized"], len(chat) - CHAT_SEND_MAX), None))
+
+async def _asummarize_chat(entries: List[Dict], prior: str, upto: int, evicted: int, started):
+    transcript = "\n".join(f"{m['role']}: {' '.join(m['content'].split())}" for m in entries)
+    try:
+        resp = await aclient.chat.completions.create(
+            model="gpt-4o-mini",
+            temperature=0.2,
+            max_tokens=80,
+            messages=[
+                {"role": "system", "content": (
+                    "Compress this meditation-session chat into ONE short factual sentence: "
+                    "what the practitioner shared, felt or asked. No advice, no preamble.")},
+                {"role": "user", "content": (f"Earlier summary: {prior}\n\n" if prior else "") + transcript},
+            ],
+        )
+        summary = resp.choices[0].message.content.strip()
+    except Exception:
+        summary = ""   # silent: the turns stay verbatim and the next message retries
+    if state["start_at"] != started:   # ignore results from a previous session
+        return
+    state["summary_pending"] = False
+    if summary:
+        # Only now stop sending these entries verbatim; shift for any that fell off meanwhile
+        state["summary"] = summary
+        state["summarized"] = max(0, upto - (state["chat_evicted"] - evicted))
+
+def _maybe_summarize():
+    if state["summary_pending"]:
+        return
+    upto = len(state["chat"]) - CHAT_VERBATIM
+    if upto - state["summarized"] < SUMMARY_BATCH:
+        return
+    entries = list(itertools.islice(state["chat"], state["summarized"], upto))
+    state["summary_pending"] = True
+    pn.state.execute(partial(_asummarize_chat, entries, state["summary"], upto,
+                             state["chat_evicted"], state["start_at"]))
+
 def _send_text(text: str):
     if not text.strip():
         return
     append_user(text.strip())
     if state["mode"] == "guided":
-        try:
-            reply = llm_reply(state["chat"][-12:], system_prompt())
-            append_assistant(reply, speak=True)
-        except Exception as e:
-            pn.state.notifications.error(f"LLM error: {e}")
+        # Reply from the current summary plus everything it doesn't cover yet
+        pn.state.execute(partial(astream_assistant, _chat_unsummarized(), system_prompt()))
+        _maybe_summarize()
 
 def _send_clicked(_=None):
     txt = (user_input.value or "")
@@ -387,26 +745,52 @@ def _send_on_enter(event):
 
 user_input.param.watch(_send_on_enter, "value")
 
+async def _agenerate_phase(i:int):
+    title, _ = PHASES[i]
+    await astream_assistant([{"role":"user", "content": phase_prompt(i)}], system_prompt(),
+                            title=title, error_label="Phase error")
+
+async def _aprefetch_phase(i:int, slot:Dict):
+    """Fill `slot` with phase i's text + mp3; on any error leave it empty (live fallback)."""
+    try:
+        chunks = [d async for d in allm_reply_stream([{"role":"user", "content": phase_prompt(i)}],
+                                                     system_prompt())]
+        text = "".join(chunks).strip()
+        mp3 = await atts_mp3(text, state["voice"])
+    except Exception:
+        return   # silent: _next generates the phase live instead
+    slot["mp3"] = mp3
+    slot["text"] = text   # set last: marks the slot as ready
+
+def _prefetch_phase(i:int):
+    slot = {"phase_i": i, "text": None, "mp3": None}
+    state["prefetch"] = slot
+    pn.state.execute(partial(_aprefetch_phase, i, slot))
+
 def _generate_phase(i:int):
     title, _ = PHASES[i]
     if state["mode"] == "self":
-        txt = self_guided_text(i)
+        txt = state["sg_texts"][i]
         append_assistant(txt, title=title, speak=False)
         return
-    try:
-        reply = llm_reply([{"role":"user", "content": phase_prompt(i)}], system_prompt())
-        append_assistant(reply, title=title, speak=True)
-    except Exception as e:
-        pn.state.notifications.error(f"Phase error: {e}")
+    pn.state.execute(partial(_agenerate_phase, i))
 
 def _start(_=None):
     total = int(duration_slider.value) * 60
     state["minutes"] = int(duration_slider.value)
+    state["sg_texts"] = tuple(self_guided_text(i) for i in range(len(PHASES)))
     state["start_at"] = datetime.now(timezone.utc)
     state["end_at"]   = state["start_at"] + timedelta(seconds=total)
-    timer_label.object = f"00:00 / {_fmt(total)}"
+    state["total_sec"], state["total_str"] = total, _fmt(total)   # constant for the session
+    timer_label.object = f"00:00 / {state['total_str']}"
     state["phase_i"] = 0
+    state["prefetch"] = {"phase_i": None, "text": None, "mp3": None}
     state["chat"].clear()
+    state["last_assistant_text"] = ""
+    state["summary"], state["summarized"] = "", 0
+    state["summary_pending"], state["chat_evicted"] = False, 0
+    _NOTE_CACHE.clear()
+    state["tts_js_injected"] = False
     chat_box.objects = []
     audio_out.object = ""
     next_btn.disabled = False
@@ -422,6 +806,10 @@ def _start(_=None):
     # Build auto phase schedule (equal quarters): thresholds for when to MOVE TO next phase
     q = total / 4.0
     state["phase_marks"] = [int(q*1), int(q*2), int(q*3)]  # elapsed seconds
+    for i, mark in enumerate(state["phase_marks"]):
+        _schedule(mark - PREFETCH_LEAD, partial(_prefetch_due, i))
+        _schedule(mark, partial(_phase_due, i))
+    _schedule(total, _session_due)
 
     _set_timer(True)
     _generate_phase(0)
@@ -432,11 +820,11 @@ def _repeat(_=None):
     if state["mode"] == "self":
         pn.state.notifications.info("Self-guided mode: no voice to repeat.")
         return
-    for m in reversed(state["chat"]):
-        if m["role"]=="assistant":
-            _speak_text(m["content"])
-            return
-    pn.state.notifications.info("Nothing to repeat yet.")
+    t = state.get("last_assistant_text")
+    if t:
+        _speak_text(t)
+    else:
+        pn.state.notifications.info("Nothing to repeat yet.")
 repeat_btn.on_click(_repeat)
 
 def _next(_=None, auto: bool=False):
@@ -447,14 +835,20 @@ def _next(_=None, auto: bool=False):
             pn.state.notifications.info("All phases complete.")
         return
     state["phase_i"] = i + 1
-    _generate_phase(state["phase_i"])
+    slot = state["prefetch"]
+    if slot["phase_i"] == state["phase_i"] and slot["text"]:
+        append_assistant(slot["text"], title=PHASES[state["phase_i"]][0], speak=False)
+        if slot["mp3"]:
+            _play_mp3(slot["mp3"])
+    else:
+        _generate_phase(state["phase_i"])
     if state["phase_i"] >= len(PHASES)-1:
         next_btn.disabled = True
 next_btn.on_click(_next)
 
 # ---------- Certificate (personalized full-page) ----------
 import io, textwrap
-from datetime import datetime
+from datetime import date
 
 # Try ReportLab; fall back to tiny PDF writer
 try:
@@ -465,19 +859,25 @@ try:
 except Exception:
     _CERT_HAS_RL = False
 
+_QUOTE_TABLE = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'", "—": "-", "–": "-", "…": "...", "\u00a0": " "})
+
 def _norm_quotes(s: str) -> str:
-    repl = {"“": '"', "”": '"', "‘": "'", "’": "'", "—": "-", "–": "-", "…": "...", "\u00a0": " "}
-    return "".join(repl.get(ch, ch) for ch in s)
+    return s.translate(_QUOTE_TABLE)
+
+# One TextWrapper per page width: textwrap.wrap() would build (and compile) a new one per paragraph
+_WRAPPERS = {w: textwrap.TextWrapper(width=w, break_long_words=False, break_on_hyphens=False) for w in (92, 95)}
 
 def _wrap_lines(text: str, width: int = 95):
-    lines = []
-    for para in text.split("\n"):
-        para = para.strip()
-        if not para:
-            lines.append("")
-            continue
-        lines.extend(textwrap.wrap(para, width=width) or [""])
-    return lines
+    wrapper = _WRAPPERS.get(width)
+    if wrapper is None:
+        wrapper = _WRAPPERS.setdefault(width, textwrap.TextWrapper(width=width, break_long_words=False, break_on_hyphens=False))
+    # blank paragraphs (and any that wrap to nothing) still take one empty line
+    return list(itertools.chain.from_iterable(wrapper.wrap(para.strip()) or [""] for para in text.split("\n")))
+
+# The certificate date only changes once a day; format it once per day
+@functools.lru_cache(maxsize=2)
+def _formatted_today(ordinal: int) -> str:
+    return date.fromordinal(ordinal).strftime("%B %d, %Y")
 
 def _generate_certificate_note() -> str:
     """Personal note from the selected guide, adapted to the session/chat."""
@@ -488,7 +888,7 @@ def _generate_certificate_note() -> str:
     minutes   = state.get("minutes", 10)
 
     # Use the last few turns so the note can reference the session
-    hist = state.get("chat", [])[-10:]
+    hist = _chat_tail(10)
     def _fmt(m):
         role = m.get('role', '')
         content = (m.get('content', '') or '')
@@ -529,37 +929,58 @@ def _generate_certificate_note() -> str:
         )
     return _norm_quotes(note)
 
+# Tiny-writer skeleton: objects 1–4 and their xref rows never change, so they are
+# serialised once here and each PDF only appends object 5 (the page content stream).
+_PDF_OBJ1 = b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+_PDF_OBJ2 = b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
+_PDF_OBJ3 = b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >> endobj\n"
+_PDF_OBJ4 = b"4 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
+_PDF_PARTS = (b"%PDF-1.4\n", _PDF_OBJ1, _PDF_OBJ2, _PDF_OBJ3, _PDF_OBJ4)
+_PDF_HEADER = b"".join(_PDF_PARTS)
+# offsets[n] = byte offset of object n (offsets[5] is where object 5 will start)
+_PDF_OFFSETS = list(itertools.accumulate((len(p) for p in _PDF_PARTS), initial=0))
+_PDF_XREF_HEAD = b"xref\n0 6\n0000000000 65535 f \n" + b"".join(
+    b"%010d 00000 n \n" % off for off in _PDF_OFFSETS[1:5])
+# PDF string literals: escape backslash and parentheses in one C-level pass
+_PDF_ESC_TABLE = str.maketrans({"\\": "\\\\", "(": "\\(", ")": "\\)"})
+
+def _pdf_esc(s: str) -> str:
+    return s.translate(_PDF_ESC_TABLE)
+
+_PDF_TRAILER_FMT = b"%010d 00000 n \ntrailer << /Size 6 /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+
 def _simple_pdf_bytes_fullpage(title: str, subtitle: str, body: str) -> bytes:
     """Tiny built-in PDF (no ReportLab) — single page Helvetica."""
-    def esc(s): return s.replace("\\","\\\\").replace("(","\\(").replace(")","\\)")
     W, H = (595, 842)  # A4 pts
     left, top, bottom = 48, 800, 48
-    lines = []
+    # Content stream goes straight into latin-1 bytes, one operator per line
+    contents = bytearray()
+    def emit(op: str):
+        contents.extend(op.encode("latin-1","ignore")); contents.append(0x0A)
+    # One text object for the whole page; every Td moves relative to the previous line
+    emit("BT")
     # title
-    lines += ["BT", "/F1 20 Tf", f"{left} {top} Td", f"({esc(title)}) Tj", "ET"]
+    emit("/F1 20 Tf"); emit(f"{left} {top} Td"); emit(f"({_pdf_esc(title)}) Tj")
     y = top - 28
     # subtitle
-    lines += ["BT", "/F1 11 Tf", f"{left} {y} Td", f"({esc(subtitle)}) Tj", "ET"]
+    emit("/F1 11 Tf"); emit("0 -28 Td"); emit(f"({_pdf_esc(subtitle)}) Tj")
     y -= 18
     # divider is omitted in this tiny writer
+    emit("/F1 12 Tf"); emit("0 -18 Td")
     for ln in _wrap_lines(body, width=92):
         if y <= bottom + 16: break
-        lines += ["BT", "/F1 12 Tf", f"{left} {y} Td", f"({esc(ln)}) Tj", "ET"]
+        emit(f"({_pdf_esc(ln)}) Tj"); emit("0 -16 Td")
         y -= 16
-    contents = "\n".join(lines).encode("latin-1","ignore")
-    stream = b"<< /Length %d >>\nstream\n" % len(contents) + contents + b"\nendstream\n"
-    obj1 = b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
-    obj2 = b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
-    obj3 = b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >> endobj\n"
-    obj4 = b"4 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
-    obj5 = b"5 0 obj " + stream + b"endobj\n"
-    parts = [b"%PDF-1.4\n", obj1, obj2, obj3, obj4, obj5]
-    offsets, buf = [], b""
-    for p in parts: offsets.append(len(buf)); buf += p
+    emit("ET")
+    buf = bytearray(_PDF_HEADER)
+    # the last emitted newline doubles as the EOL before `endstream`, outside /Length
+    buf.extend(b"5 0 obj << /Length %d >>\nstream\n" % (len(contents) - 1))
+    buf.extend(contents)
+    buf.extend(b"endstream\nendobj\n")
     xref_pos = len(buf)
-    xref = ["xref","0 6","0000000000 65535 f "] + [f"{off:010d} 00000 n " for off in offsets]
-    trailer = "trailer << /Size 6 /Root 1 0 R >>\nstartxref\n" + str(xref_pos) + "\n%%EOF\n"
-    return buf + ("\n".join(xref) + "\n" + trailer).encode("latin-1","ignore")
+    buf.extend(_PDF_XREF_HEAD)
+    buf.extend(_PDF_TRAILER_FMT % (_PDF_OFFSETS[5], xref_pos))
+    return bytes(buf)
 
 def build_certificate_pdf() -> bytes:
     """Public: called by the FileDownload button."""
@@ -567,10 +988,11 @@ def build_certificate_pdf() -> bytes:
     intent  = state.get("intent","—")
     mantra  = state.get("mantra","—")
     minutes = state.get("minutes",10)
-    date_str = datetime.now().strftime("%B %d, %Y")
+    date_str = _formatted_today(date.today().toordinal())
 
-    title = "Om — Participation Certificate"
-    subtitle = f"{who_label}  •  {date_str}  •  {minutes} min  •  Intent: {intent}  •  Mantra: “{mantra}”"
+    # Normalized once here; the note body already comes back normalized
+    title = _norm_quotes("Om — Participation Certificate")
+    subtitle = _norm_quotes(f"{who_label}  •  {date_str}  •  {minutes} min  •  Intent: {intent}  •  Mantra: “{mantra}”")
     body = _generate_certificate_note()
 
     if not _CERT_HAS_RL:
@@ -586,16 +1008,16 @@ def build_certificate_pdf() -> bytes:
     # background + title
     c.setFillColorRGB(0.08, 0.09, 0.11); c.rect(0, 0, W, H, fill=1, stroke=0)
     c.setFillColorRGB(1, 1, 1)
-    c.setFont("Helvetica-Bold", 24); c.drawString(left, top, _norm_quotes(title))
+    c.setFont("Helvetica-Bold", 24); c.drawString(left, top, title)
     y = top - 30
 
-    c.setFont("Helvetica", 11); c.drawString(left, y, _norm_quotes(subtitle)); y -= 16
+    c.setFont("Helvetica", 11); c.drawString(left, y, subtitle); y -= 16
     c.setLineWidth(0.6); c.line(left, y, W - right, y); y -= 16
 
     c.setFont("Helvetica", 12)
     for ln in _wrap_lines(body, width=95):
         if y <= bottom + 16: break
-        c.drawString(left, y, _norm_quotes(ln)); y -= 16
+        c.drawString(left, y, ln); y -= 16
 
     y -= 10; c.setLineWidth(0.4); c.line(left, y, left + 55*mm, y); y -= 12
     c.setFont("Helvetica-Oblique", 11); c.drawString(left, y, _norm_quotes(who_label))
@@ -629,20 +1051,74 @@ tmpl.main.append(pn.Column(container, css_classes=["card"], sizing_mode="stretch
 show_step(1)
 tmpl.servable()
 
-if __name__ == "__main__":
-    pn.serve(tmpl, address="0.0.0.0", port=8913, show=True)
-
 # =====================  Om_1.0 — PATCH (auto-chained TTS + working certificate)  =====================
 # Paste this AT THE END of your existing Om_1.0.py (no other edits needed).
 
 # ----- imports used by the patch (safe to re-import) -----
-import io, base64, textwrap
+import io, binascii, textwrap, time, uuid
+from tornado.web import HTTPError, RequestHandler
 try:
     import panel as pn  # already in Om_1.0
 except Exception:
     pass
 
+# --------------------------- TTS clips over HTTP (no base64 over the websocket) ---------------------------
+# Enabled only when `python Om_1_0.py` serves itself as one process (the default, see the
+# launcher at the top and __main__): clips are parked in state["audio_blobs"] and the page
+# fetches them from /tts/<uid>. Under `panel serve`, including OM_NUM_PROCS > 1, there is no
+# route to mount, so clips stay inlined as base64 data URLs.
+_TTS_HTTP = False
+_TTS_BLOB_TTL = 300   # seconds a clip stays fetchable
+_TTS_BLOB_MAX = 32    # clips kept per session, oldest dropped first
+
+class TTSHandler(RequestHandler):
+    def get(self, uid):
+        blob = state["audio_blobs"].get(uid)
+        if blob is None:
+            raise HTTPError(404)
+        self.set_header("Content-Type", "audio/mpeg")
+        self.set_header("Cache-Control", "private, max-age=%d" % _TTS_BLOB_TTL)
+        self.write(blob[1])
+
+def _stash_audio_blob(mp3_bytes: bytes) -> str:
+    now = time.monotonic()
+    blobs = state["audio_blobs"]
+    for uid in [u for u, (t, _) in blobs.items() if now - t > _TTS_BLOB_TTL]:
+        del blobs[uid]
+    while len(blobs) >= _TTS_BLOB_MAX:
+        del blobs[next(iter(blobs))]   # dicts keep insertion order
+    uid = uuid.uuid4().hex
+    blobs[uid] = (now, mp3_bytes)
+    return uid
+
 # --------------------------- AUTO-CHAINED TTS (never interrupt) ---------------------------
+# Page-side player: one hidden <audio> element fed from a FIFO of clip URLs.
+_OM10_TTS_SETUP = (
+    "if(!window.omTTS){"
+    "  const audio = document.createElement('audio');"
+    "  audio.id = 'om_tts_audio';"
+    "  audio.style.display = 'none';"
+    "  audio.autoplay = false;"
+    "  document.body.appendChild(audio);"
+    "  const q = [];"
+    "  let playing = false;"
+    "  function next(){"
+    "    if(q.length===0){ playing=false; return; }"
+    "    audio.src = q.shift();"
+    "    playing = true;"
+    "    const p = audio.play();"
+    "    if(p!==undefined){ p.catch(e=>console.log('Autoplay blocked', e)); }"
+    "  }"
+    "  audio.addEventListener('ended', ()=>{ playing=false; next(); });"
+    "  audio.addEventListener('error',  ()=>{ playing=false; next(); });"
+    "  window.omTTS = {"
+    "    enqueue: function(src){ q.push(src); if(!playing){ next(); } },"
+    "    stop: function(){ try{ audio.pause(); }catch(e){} playing=false; q.length=0; audio.removeAttribute('src'); },"
+    "    _queue: q, _next: next, _audio: audio"
+    "  };"
+    "}"
+)
+
 def _om10_audio_player_from_mp3(mp3_bytes: bytes):
     """
     Creates (or reuses) one hidden <audio> element in the page and enqueues mp3 clips
@@ -650,44 +1126,36 @@ def _om10_audio_player_from_mp3(mp3_bytes: bytes):
     """
     if not mp3_bytes:
         return pn.pane.HTML("")
-    b64 = base64.b64encode(mp3_bytes).decode("utf-8")
+    if _TTS_HTTP:
+        src = f"/tts/{_stash_audio_blob(mp3_bytes)}"
+    else:
+        src = "data:audio/mpeg;base64," + binascii.b2a_base64(mp3_bytes, newline=False).decode("ascii")
+    # A cached clip replays the same bytes; the nonce keeps a Repeat from being an identical
+    # (and therefore never sent) update
+    state["tts_seq"] = n = state.get("tts_seq", 0) + 1
+    if state.get("tts_js_injected"):
+        # Player already lives in the page: ship just the enqueue call
+        return pn.pane.HTML(f"<script data-n=\"{n}\">window.omTTS && window.omTTS.enqueue('{src}');</script>",
+                            sizing_mode="stretch_width")
+    state["tts_js_injected"] = True
     html = (
-        "<div id=\"om_tts_inject\"></div>"
-        "<script>(function(){"
-        "try{"
-        "  if(!window.omTTS){"
-        "    const audio = document.createElement('audio');"
-        "    audio.id = 'om_tts_audio';"
-        "    audio.style.display = 'none';"
-        "    audio.autoplay = false;"
-        "    document.body.appendChild(audio);"
-        "    const q = [];"
-        "    let playing = false;"
-        "    function next(){"
-        "      if(q.length===0){ playing=false; return; }"
-        "      const b64 = q.shift();"
-        "      audio.src = 'data:audio/mpeg;base64,' + b64;"
-        "      playing = true;"
-        "      const p = audio.play();"
-        "      if(p!==undefined){ p.catch(e=>console.log('Autoplay blocked', e)); }"
-        "    }"
-        "    audio.addEventListener('ended', ()=>{ playing=false; next(); });"
-        "    audio.addEventListener('error',  ()=>{ playing=false; next(); });"
-        "    window.omTTS = {"
-        "      enqueue: function(b){ q.push(b); if(!playing){ next(); } },"
-        "      stop: function(){ try{ audio.pause(); }catch(e){} playing=false; q.length=0; audio.removeAttribute('src'); },"
-        "      _queue: q, _next: next, _audio: audio"
-        "    };"
-        "  }"
-        "  window.omTTS.enqueue('%s');"
-        "}catch(e){ console.log('TTS enqueue error', e); }"
-        "})();</script>"
-    ) % b64
+        f'<div id="om_tts_inject"></div><script data-n="{n}">(function(){{try{{{_OM10_TTS_SETUP}'
+        f"window.omTTS.enqueue('{src}');"
+        "}catch(e){ console.log('TTS enqueue error', e); }})();</script>"
+    )
     return pn.pane.HTML(html, sizing_mode="stretch_width")
 
 def _om10_audio_stop_html():
     return pn.pane.HTML("<script>try{ if(window.omTTS){ window.omTTS.stop(); } }catch(e){}</script>")
 
+# Route all playback through the queue: ENQUEUE (never interrupts)
+def _play_mp3(mp3: bytes):
+    audio_out.object = _om10_audio_player_from_mp3(mp3).object
+    try:
+        audio_out.param.trigger("object")
+    except Exception:
+        pass
+
 # Monkeypatch _speak_text to enqueue instead of interrupting
 try:
     _om10__orig_speak = _speak_text  # keep original for fallback
@@ -709,13 +1177,12 @@ def _speak_text(text: str):
             if _om10__orig_speak:
                 return _om10__orig_speak(text)
             return
-        mp3 = tts_mp3(text, voice)
-        # ENQUEUE (never interrupts)
-        audio_out.object = _om10_audio_player_from_mp3(mp3).object
-        try:
-            audio_out.param.trigger("object")
-        except Exception:
-            pass
+        def _done(fut):
+            try:
+                _play_mp3(fut.result())
+            except Exception as e:
+                _notify_error(f"TTS error: {e}")
+        run_in_background(tts_mp3, text, voice, done=_done)
     except Exception as e:
         try:
             pn.state.notifications.error(f"TTS error: {e}")
@@ -735,8 +1202,8 @@ except NameError:
     pass
 
 # ===== FINAL OVERRIDE: full-page personalized certificate (wins last) =====
-import io, textwrap
-from datetime import datetime
+import io, json, textwrap, time
+from datetime import date
 
 try:
     from reportlab.lib.pagesizes import A4
@@ -746,28 +1213,54 @@ try:
 except Exception:
     _CERT_HAS_RL = False
 
-def _final_norm_quotes(s: str) -> str:
-    repl = {"“": '"', "”": '"', "‘": "'", "’": "'", "—": "-", "–": "-", "…": "...", "\u00a0": " "}
-    return "".join(repl.get(ch, ch) for ch in s)
+# Quote normalising and line wrapping are shared with the certificate section above
+# (_norm_quotes / _wrap_lines).
 
-def _final_wrap_lines(text: str, width: int = 95):
-    lines = []
-    for para in text.split("\n"):
-        para = para.strip()
-        if not para:
-            lines.append("")
-            continue
-        lines.extend(textwrap.wrap(para, width=width) or [""])
-    return lines
+# Generated notes by session signature; a re-click or a fallback rebuild reuses the note
+_NOTE_CACHE: Dict[str, str] = {}
+_NOTE_CACHE_MAX = 64
 
-def _final_generate_note() -> str:
+# The note and the agent only see the latest turns; older ones add tokens, not relevance
+_CHAT_TAIL = 16
+
+# Circuit breaker per dependency, shared by every session of this process: after
+# _BREAKER_FAILS failures in a row, skip straight to the local fallback for _BREAKER_COOLDOWN s
+_BREAKER_FAILS = 3
+_BREAKER_COOLDOWN = 60.0
+_BREAKER: Dict[str, Dict[str, float]] = pn.state.cache.setdefault(
+    "om_breaker", {"openai": {"fails": 0, "until": 0.0}, "agent": {"fails": 0, "until": 0.0}})
+
+def _breaker_open(name: str) -> bool:
+    return time.monotonic() < _BREAKER[name]["until"]
+
+def _breaker_record(name: str, ok: bool):
+    b = _BREAKER[name]
+    if ok:
+        b["fails"], b["until"] = 0, 0.0
+        return
+    b["fails"] += 1
+    if b["fails"] >= _BREAKER_FAILS:
+        b["until"] = time.monotonic() + _BREAKER_COOLDOWN
+
+def _note_key(persona: str, intent: str, mantra: str, minutes: int, hist: List[Dict]) -> str:
+    blob = json.dumps({"persona": persona, "intent": intent, "mantra": mantra, "minutes": minutes,
+                       "chat": [[m.get("role", ""), m.get("content", "")] for m in hist]},
+                      sort_keys=True, ensure_ascii=False)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+def _final_generate_note() -> Tuple[str, bool]:
+    """Returns (note, from_api); the stock fallback note is flagged so nothing caches it."""
     who_label = PERSONAS.get(state.get("persona", ""), {}).get("label", "Your guide")
     style     = PERSONAS.get(state.get("persona", ""), {}).get("style", "Warm and grounded.")
     intent    = state.get("intent", "—")
     mantra    = state.get("mantra", "—")
     minutes   = state.get("minutes", 10)
 
-    hist = state.get("chat", [])[-12:]
+    hist = _chat_tail(_CHAT_TAIL)
+    key = _note_key(state.get("persona", ""), intent, mantra, minutes, hist)
+    if key in _NOTE_CACHE:
+        return _NOTE_CACHE[key], True
+
     def _fmt(m):
         role = m.get('role', '')
         content = (m.get('content', '') or '')
@@ -776,6 +1269,8 @@ def _final_generate_note() -> str:
     history_txt = "\n".join(_fmt(m) for m in hist)
 
     try:
+        if _breaker_open("openai"):
+            raise RuntimeError("OpenAI recently unavailable")
         sys = (
             f"You are {who_label}, a meditation guide. Style: {style}\n"
             "Write a warm, encouraging ONE-PAGE note for the practitioner.\n"
@@ -794,8 +1289,11 @@ def _final_generate_note() -> str:
             max_tokens=650,   # allow a longer page
             messages=[{"role":"system","content":sys},{"role":"user","content":prompt}],
         )
-        note = resp.choices[0].message.content.strip()
+        note = _norm_quotes(resp.choices[0].message.content.strip())
+        _breaker_record("openai", True)
     except Exception:
+        if not _breaker_open("openai"):
+            _breaker_record("openai", False)
         note = (
             f"Dear friend,\n\n"
             f"Today you practiced with the intention of {intent.lower()}. Let your mantra—“{mantra}”—"
@@ -807,49 +1305,30 @@ def _final_generate_note() -> str:
             f"Thank you for showing up with courage. May your practice stay steady and kind.\n\n"
             f"With gratitude,\n{who_label}"
         )
-    return _final_norm_quotes(note)
+        return _norm_quotes(note), False   # not cached: the next download retries the API
+    _NOTE_CACHE[key] = note
+    while len(_NOTE_CACHE) > _NOTE_CACHE_MAX:
+        del _NOTE_CACHE[next(iter(_NOTE_CACHE))]
+    return note, True
 
-def _final_simple_pdf(title: str, subtitle: str, body: str) -> bytes:
-    def esc(s): return s.replace("\\","\\\\").replace("(","\\(").replace(")","\\)")
-    W, H = (595, 842)
-    left, top, bottom = 48, 800, 48
-    lines = []
-    lines += ["BT", "/F1 20 Tf", f"{left} {top} Td", f"({esc(title)}) Tj", "ET"]
-    y = top - 28
-    lines += ["BT", "/F1 11 Tf", f"{left} {y} Td", f"({esc(subtitle)}) Tj", "ET"]
-    y -= 18
-    for ln in _final_wrap_lines(body, width=92):
-        if y <= bottom + 16: break
-        lines += ["BT", "/F1 12 Tf", f"{left} {y} Td", f"({esc(ln)}) Tj", "ET"]
-        y -= 16
-    contents = "\n".join(lines).encode("latin-1","ignore")
-    stream = b"<< /Length %d >>\nstream\n" % len(contents) + contents + b"\nendstream\n"
-    obj1 = b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
-    obj2 = b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
-    obj3 = b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >> endobj\n"
-    obj4 = b"4 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
-    obj5 = b"5 0 obj " + stream + b"endobj\n"
-    parts = [b"%PDF-1.4\n", obj1, obj2, obj3, obj4, obj5]
-    offsets, buf = [], b""
-    for p in parts: offsets.append(len(buf)); buf += p
-    xref_pos = len(buf)
-    xref = ["xref","0 6","0000000000 65535 f "] + [f"{off:010d} 00000 n " for off in offsets]
-    trailer = "trailer << /Size 6 /Root 1 0 R >>\nstartxref\n" + str(xref_pos) + "\n%%EOF\n"
-    return buf + ("\n".join(xref) + "\n" + trailer).encode("latin-1","ignore")
+# Same page layout as the tiny writer above; share its prebuilt skeleton
+_final_simple_pdf = _simple_pdf_bytes_fullpage
 
-def _fullpage_build_certificate_pdf() -> bytes:
+def _fullpage_build_certificate_pdf() -> Tuple[bytes, bool]:
+    """Returns (pdf, cacheable): cacheable only when the note really came from OpenAI."""
     who_label = PERSONAS.get(state.get("persona",""),{}).get("label","Your guide")
     intent  = state.get("intent","—")
     mantra  = state.get("mantra","—")
     minutes = state.get("minutes",10)
-    date_str = datetime.now().strftime("%B %d, %Y")
+    date_str = _formatted_today(date.today().toordinal())
 
-    title = "Om — Participation Certificate"
-    subtitle = f"{who_label}  •  {date_str}  •  {minutes} min  •  Intent: {intent}  •  Mantra: “{mantra}”"
-    body = _final_generate_note()
+    # Normalized once here; the note body already comes back normalized
+    title = _norm_quotes("Om — Participation Certificate")
+    subtitle = _norm_quotes(f"{who_label}  •  {date_str}  •  {minutes} min  •  Intent: {intent}  •  Mantra: “{mantra}”")
+    body, from_api = _final_generate_note()
 
     if not _CERT_HAS_RL:
-        return _final_simple_pdf(title, subtitle, body)
+        return _final_simple_pdf(title, subtitle, body), from_api
 
     bio = io.BytesIO()
     c = canvas.Canvas(bio, pagesize=A4)
@@ -859,22 +1338,25 @@ def _fullpage_build_certificate_pdf() -> bytes:
 
     c.setFillColorRGB(0.08, 0.09, 0.11); c.rect(0, 0, W, H, fill=1, stroke=0)
     c.setFillColorRGB(1, 1, 1)
-    c.setFont("Helvetica-Bold", 24); c.drawString(left, top, _final_norm_quotes(title))
-    y = top - 30
-
-    c.setFont("Helvetica", 11); c.drawString(left, y, _final_norm_quotes(subtitle)); y -= 16
+    # Title + subtitle in one text object; leading carries the line advances
+    t = c.beginText(left, top)
+    t.setFont("Helvetica-Bold", 24, leading=30); t.textLine(title)
+    t.setFont("Helvetica", 11, leading=16); t.textLine(subtitle)
+    c.drawText(t); y = t.getY()
     c.setLineWidth(0.6); c.line(left, y, W - right, y); y -= 16
 
-    c.setFont("Helvetica", 12)
-    for ln in _final_wrap_lines(body, width=95):
-        if y <= bottom + 16: break
-        c.drawString(left, y, _final_norm_quotes(ln)); y -= 16
+    t = c.beginText(left, y)
+    t.setFont("Helvetica", 12, leading=16)
+    for ln in _wrap_lines(body, width=95):
+        if t.getY() <= bottom + 16: break
+        t.textLine(ln)
+    c.drawText(t); y = t.getY()
 
     y -= 10; c.setLineWidth(0.4); c.line(left, y, left + 55*mm, y); y -= 12
-    c.setFont("Helvetica-Oblique", 11); c.drawString(left, y, _final_norm_quotes(who_label))
+    c.setFont("Helvetica-Oblique", 11); c.drawString(left, y, _norm_quotes(who_label))
 
     c.showPage(); c.save()
-    return bio.getvalue()
+    return bio.getvalue(), from_api
 
 # Make this the version your app uses (overrides earlier/shorter one)
 build_certificate_pdf = _fullpage_build_certificate_pdf
@@ -883,27 +1365,53 @@ build_certificate_pdf = _fullpage_build_certificate_pdf
 # ===== CERT BUTTON: wire + show at session finish (drop-in, paste at end) =====
 import io
 
+# Finished certificates by session signature, LRU, shared across sessions (and callback
+# threads) of this process. Only agent certificates go in (see build_certificate_pdf): a
+# local fallback one is rebuilt on the next click so the agent / OpenAI get another chance.
+_CERT_PDFS: "collections.OrderedDict[tuple, bytes]" = pn.state.cache.setdefault(
+    "om_cert_pdfs", collections.OrderedDict())
+_CERT_PDFS_LOCK: threading.Lock = pn.state.cache.setdefault("om_cert_pdfs_lock", threading.Lock())
+_CERT_PDFS_MAX = 16
+
+def _cert_signature() -> tuple:
+    # The date is printed on the certificate, so the same session tomorrow is a new one
+    return (date.today().toordinal(), state.get("persona"), state.get("intent"), state.get("mantra"),
+            state.get("minutes"), tuple((m.get("role"), m.get("content")) for m in state.get("chat", ())))
+
+def _certificate_for(sig: tuple) -> bytes:
+    with _CERT_PDFS_LOCK:
+        pdf = _CERT_PDFS.get(sig)
+        if pdf is not None:
+            _CERT_PDFS.move_to_end(sig)
+            return pdf
+    pdf, cacheable = build_certificate_pdf()
+    if cacheable:
+        with _CERT_PDFS_LOCK:
+            _CERT_PDFS[sig] = pdf
+            while len(_CERT_PDFS) > _CERT_PDFS_MAX:
+                _CERT_PDFS.popitem(last=False)
+    return pdf
+
 def _cert_file():
-    pdf = build_certificate_pdf()
-    bio = io.BytesIO(pdf); bio.seek(0)
+    # Built on click only; a re-click or an identical session is served from _CERT_PDFS
+    bio = io.BytesIO(_certificate_for(_cert_signature())); bio.seek(0)
     try: bio.name = "om_certificate.pdf"
     except Exception: pass
     return bio
 
 def _cert_show_button():
-    # Support both old/new Panel: set callback and also prefill .file
-    try: cert_btn.callback = _cert_file
-    except Exception: pass
-    try: cert_btn.file = _cert_file()
-    except Exception: pass
-    try: cert_btn.filename = "om_certificate.pdf"
-    except Exception: pass
-    try: cert_btn.embed = False
-    except Exception: pass
-    cert_btn.visible = True
-    cert_btn.disabled = False
-    try: cert_btn.param.trigger("file")
-    except Exception: pass
+    # Only push params that actually differ, in one batch; the PDF itself is pulled by the
+    # callback when the button is clicked, so nothing is built or encoded here
+    wanted = {"callback": _cert_file, "filename": "om_certificate.pdf", "embed": False,
+              "visible": True, "disabled": False}
+    changed = {k: v for k, v in wanted.items() if getattr(cert_btn, k, None) != v}
+    if not changed:
+        return
+    try: cert_btn.param.update(**changed)
+    except Exception:
+        for k, v in changed.items():
+            try: setattr(cert_btn, k, v)
+            except Exception: pass
 
 # Preserve any previous finish handler if it exists (it likely doesn't now)
 try:
@@ -922,42 +1430,96 @@ def _on_session_finished(*args, **kwargs):
 # ==================== Om_1_0.py — Agent-backed report/certificate (drop-in) ====================
 # Paste this block AT THE VERY END of Om_1_0.py. No other edits needed.
 
-import os, json
+import io, os, json, shutil
 try:
     import requests
 except Exception:
     requests = None  # we'll fall back if requests is missing
+try:
+    import orjson
+    _agent_dumps = orjson.dumps
+except Exception:
+    # stdlib fallback; same UTF-8 JSON bytes, just slower to produce
+    _agent_dumps = lambda obj: json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+_AGENT_HEADERS = {"Content-Type": "application/json"}
 
 # Point to your agent (override via env if deployed elsewhere)
 OM_REPORT_AGENT_URL = os.getenv("OM_REPORT_AGENT_URL", "http://localhost:8088/report")
 
-def _agent_build_certificate_pdf() -> bytes:
+# One keep-alive session to the agent per process, shared by every app session
+_agent_session = None
+if requests is not None:
+    if "om_agent_session" not in pn.state.cache:
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        # One agent host, so a small pool. The single quick retry only covers connect errors:
+        # urllib3 never resends a POST after a read error (a stale keep-alive socket included),
+        # and build_certificate_pdf falls back to the local certificate then.
+        _retry = Retry(total=1, backoff_factor=0.2)
+        _sess = requests.Session()
+        _sess.mount("http://", HTTPAdapter(pool_connections=2, pool_maxsize=2, max_retries=_retry))
+        _sess.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=2, max_retries=_retry))
+        pn.state.cache["om_agent_session"] = _sess
+    _agent_session = pn.state.cache["om_agent_session"]
+
+# Persona fields of the agent payload only change with the persona; rebuild them then
+_agent_payload_cache = {"persona_key": None, "base": None}
+
+# At most two agent requests in flight per process, whatever the number of sessions
+_AGENT_SLOTS: threading.BoundedSemaphore = pn.state.cache.setdefault(
+    "om_agent_slots", threading.BoundedSemaphore(2))
+_AGENT_CONNECT_TIMEOUT = 2.0
+
+class _AgentBusy(RuntimeError):
+    """No agent slot came free in time: local load, not an agent failure."""
+
+def _agent_build_certificate_pdf(sent: Optional[threading.Event] = None) -> bytes:
     """
     Calls the external report agent to get a PDF.
     Raises on error so we can fall back cleanly.
+    `sent` is set once a slot is taken and the request actually goes out.
     """
-    if requests is None:
+    if _agent_session is None:
         raise RuntimeError("`requests` is not installed")
 
-    who_map = PERSONAS.get(state.get("persona",""), {})
-    payload = {
-        "persona_label": who_map.get("label", "Your guide"),
-        "persona_style": who_map.get("style", "Warm and grounded."),
-        "intent": state.get("intent", "—"),
-        "mantra": state.get("mantra", "—"),
-        "minutes": int(state.get("minutes", 10) or 10),
-        "chat": [
-            {"role": str(m.get("role","")), "content": str(m.get("content",""))}
-            for m in state.get("chat", [])
-        ],
-        "format": "pdf",
-    }
-
-    r = requests.post(OM_REPORT_AGENT_URL, json=payload, timeout=45)
-    ct = (r.headers.get("content-type") or "").lower()
-    if r.status_code == 200 and "application/pdf" in ct:
-        return r.content
-    raise RuntimeError(f"Agent responded {r.status_code}: {r.text[:200]}")
+    persona = state.get("persona","")
+    if _agent_payload_cache["persona_key"] != persona or _agent_payload_cache["base"] is None:
+        who_map = PERSONAS.get(persona, {})
+        _agent_payload_cache["base"] = {
+            "persona_label": who_map.get("label", "Your guide"),
+            "persona_style": who_map.get("style", "Warm and grounded."),
+            "format": "pdf",
+        }
+        _agent_payload_cache["persona_key"] = persona
+    payload = dict(_agent_payload_cache["base"])
+    payload["intent"] = state.get("intent", "—")
+    payload["mantra"] = state.get("mantra", "—")
+    payload["minutes"] = int(state.get("minutes", 10) or 10)
+    payload["chat"] = [
+        {"role": str(m.get("role","")), "content": str(m.get("content",""))}
+        for m in _chat_tail(_CHAT_TAIL)
+    ]
+
+    body = _agent_dumps(payload)
+
+    if not _AGENT_SLOTS.acquire(timeout=AGENT_BUDGET):
+        raise _AgentBusy("agent busy")
+    if sent is not None:
+        sent.set()
+    try:
+        # Fail fast on connect; the read may use the whole budget. The PDF is streamed
+        # straight into one buffer instead of being held as r.content as well.
+        with _agent_session.post(OM_REPORT_AGENT_URL, data=body, headers=_AGENT_HEADERS, stream=True,
+                                 timeout=(_AGENT_CONNECT_TIMEOUT, AGENT_BUDGET)) as r:
+            ct = (r.headers.get("content-type") or "").lower()
+            if r.status_code == 200 and "application/pdf" in ct:
+                r.raw.decode_content = True
+                bio = io.BytesIO()
+                shutil.copyfileobj(r.raw, bio, 64 * 1024)
+                return bio.getvalue()
+            raise RuntimeError(f"Agent responded {r.status_code}: {r.text[:200]}")
+    finally:
+        _AGENT_SLOTS.release()
 
 # Keep a reference to your existing local builder for fallback
 try:
@@ -966,38 +1528,52 @@ except NameError:
     try:
         _LOCAL_PDF_BUILDER = _fullpage_build_certificate_pdf
     except NameError:
-        # Minimal tiny-PDF fallback if neither exists
-        def _LOCAL_PDF_BUILDER():
-            body = "Om — Participation Certificate\n\nThe external report agent was unavailable.\n"
-            # tiny one-page PDF
-            def esc(s): return s.replace("\\","\\\\").replace("(","\\(").replace(")","\\)")
-            W,H = (595,842); L, T, B = 48, 800, 48
-            parts=[]; y=T
-            parts += ["BT","/F1 20 Tf",f"{L} {y} Td","(Om — Participation Certificate) Tj","ET"]; y-=28
-            for ln in body.splitlines():
-                parts += ["BT","/F1 12 Tf",f"{L} {y} Td",f"({esc(ln)}) Tj","ET"]; y-=16
-            b = "\n".join(parts).encode("latin-1","ignore")
-            stream = b"<< /Length %d >>\nstream\n" % len(b) + b + b"\nendstream\n"
-            o1=b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
-            o2=b"2 0 obj << /Type /Pages /Kids [3 0 R] /Count 1 >> endobj\n"
-            o3=b"3 0 obj << /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >> endobj\n"
-            o4=b"4 0 obj << /Type /Font /Subtype /Type1 /BaseFont /Helvetica >> endobj\n"
-            o5=b"5 0 obj "+stream+b"endobj\n"
-            parts=[b"%PDF-1.4\n",o1,o2,o3,o4,o5]; offs=[]; buf=b""
-            for p in parts: offs.append(len(buf)); buf+=p
-            xref=len(buf)
-            x=["xref","0 6","0000000000 65535 f "]+[f"{o:010d} 00000 n " for o in offs]
-            trailer=f"trailer << /Size 6 /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
-            return buf+("\n".join(x)+"\n"+trailer).encode("latin-1","ignore")
-
-# FINAL OVERRIDE: always try the agent first; on any error, use local builder
-def build_certificate_pdf() -> bytes:  # <- your FileDownload already calls this
+        # Minimal tiny-PDF fallback if neither exists (same writer as the built-in certificate)
+        _LOCAL_PDF_BUILDER = lambda: (_simple_pdf_bytes_fullpage(
+            "Om - Participation Certificate", "", "The external report agent was unavailable."), False)
+
+# Agent and local builds race on their own small pool, so a download never queues behind
+# the TTS / LLM jobs that keep _EXEC busy during sessions
+AGENT_BUDGET = 5.0   # seconds the agent gets before the local certificate wins
+if "om_cert_executor" not in pn.state.cache:
+    pn.state.cache["om_cert_executor"] = concurrent.futures.ThreadPoolExecutor(
+        max_workers=4, thread_name_prefix="om-cert")
+_CERT_EXEC: concurrent.futures.ThreadPoolExecutor = pn.state.cache["om_cert_executor"]
+
+# FINAL OVERRIDE: ask the agent and build locally in parallel; the agent wins if it answers in time
+def build_certificate_pdf() -> Tuple[bytes, bool]:  # <- your FileDownload already calls this
+    """
+    Returns (pdf, cacheable). Only an agent certificate is cacheable: the local one is a
+    fallback, rebuilt on the next click (its note is reused from _NOTE_CACHE) so the agent
+    gets another chance.
+    """
+    if _breaker_open("agent"):
+        # agent failed repeatedly just now; don't wait on it again
+        return _LOCAL_PDF_BUILDER()[0], False
+    sent = threading.Event()
+    f_agent = _CERT_EXEC.submit(_agent_build_certificate_pdf, sent)
+    f_local = _CERT_EXEC.submit(_LOCAL_PDF_BUILDER)
+    done, _ = concurrent.futures.wait([f_agent], timeout=AGENT_BUDGET)
+    if f_agent in done and f_agent.exception() is None:
+        _breaker_record("agent", True)
+        f_local.cancel()
+        return f_agent.result(), True
+    # Only a request that went out and failed (or stalled) counts against the agent;
+    # waiting for an agent slot under local load (_AgentBusy, or still queued) does not
+    if sent.is_set():
+        _breaker_record("agent", False)
+    e = f_agent.exception() if f_agent in done else f"no reply within {AGENT_BUDGET:g}s"
     try:
-        return _agent_build_certificate_pdf()
-    except Exception as e:
-        try:
-            pn.state.notifications.warn(f"Report agent unavailable, using local certificate. ({e})")
-        except Exception:
-            pass
-        return _LOCAL_PDF_BUILDER()
+        pn.state.notifications.warn(f"Report agent unavailable, using local certificate. ({e})")
+    except Exception:
+        pass
+    return f_local.result()[0], False
 # ==================== /Agent-backed report/certificate ====================
+
+if __name__ == "__main__":
+    # Single process (multi-process runs exec'd into `panel serve` at the top of the file):
+    # serve from here, after every override above has been applied, and mount the TTS route
+    pn.config.nthreads = _NUM_THREADS
+    _TTS_HTTP = True
+    pn.serve(tmpl, address="0.0.0.0", port=8913, show=False, websocket_origin="*",
+             extra_patterns=[(r"/tts/([0-9a-f]+)", TTSHandler)])